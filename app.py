@@ -1,15 +1,42 @@
 import os
-import uuid
+import time
+import tempfile
 import json
+import hashlib
+import queue
+import atexit
+import logging
+from logging.handlers import QueueHandler, QueueListener
 import requests
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import List, Optional, Tuple
 from werkzeug.utils import secure_filename
-from flask import Flask, render_template, request, redirect, url_for, session, flash, g
-from database import get_session, User, KeyCompany, initialize_database, UserUpload, GOST
-from datetime import datetime
-
-# Импорт обработчика документов
-from document_processor import DocumentProcessor, process_document_to_images
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm import load_only, joinedload
+from flask import Flask, render_template, request, redirect, url_for, session, flash, g, jsonify
+
+# Формат логов общий с document_processor; его собственный обработчик
+# замолкает, как только настроен корневой логгер
+from document_processor import LOG_FORMAT, DocumentProcessor, process_document_to_images
+
+# Потоки запросов только кладут записи в очередь, запись в stderr идёт в фоновом
+# потоке QueueListener и не блокирует обработку под нагрузкой
+log_queue = queue.SimpleQueue()
+_log_stream_handler = logging.StreamHandler()
+_log_stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+log_listener = QueueListener(log_queue, _log_stream_handler)
+log_listener.start()
+atexit.register(log_listener.stop)  # дописывает оставшиеся в очереди записи при выходе
+
+_root_logger = logging.getLogger()
+_root_logger.setLevel(logging.INFO)
+_root_logger.addHandler(QueueHandler(log_queue))
+logger = logging.getLogger(__name__)
+
+from database import get_session, User, KeyCompany, initialize_database, UserUpload, GOST, AnalysisCache
 
 # Импорт библиотек для чтения документов
 try:
@@ -33,8 +60,37 @@ except ImportError:
     PYMUPDF_AVAILABLE = False
     print("⚠️ PyMuPDF не установлен. Установите: pip install PyMuPDF")
 
+# Быстрая сериализация JSON (необязательно), иначе стандартный json
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# Сжатие сохраняемых отчётов (необязательно), иначе отчёт хранится текстом
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+# Сжатие ответов brotli/gzip (необязательно)
+try:
+    from flask_compress import Compress
+    COMPRESS_AVAILABLE = True
+except ImportError:
+    COMPRESS_AVAILABLE = False
+    print("⚠️ flask-compress не установлен. Установите: pip install flask-compress")
+
 app = Flask(__name__, static_folder='static')
 app.secret_key = os.urandom(24)
+# Статика отдаётся с ETag/Last-Modified (условные запросы); браузер кэширует её на сутки
+app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 24 * 60 * 60
+
+app.config['COMPRESS_MIN_SIZE'] = 512
+app.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
+if COMPRESS_AVAILABLE:
+    Compress(app)
 
 # ============================================================================
 # API CONFIGURATION
@@ -49,6 +105,14 @@ GEMINI_MODEL = "gemini-2.0-flash"
 GEMINI_API_BASE_V1BETA = "https://generativelanguage.googleapis.com/v1beta"
 GEMINI_API_BASE_V1 = "https://generativelanguage.googleapis.com/v1"
 
+# Общая HTTP-сессия для Gemini API: keep-alive и пул соединений между вызовами
+gemini_http = requests.Session()
+gemini_http.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=8,
+    max_retries=Retry(total=2, backoff_factor=0.25)
+))
+
 
 def is_api_key_valid(key):
     """Проверяет, что API ключ валиден."""
@@ -76,19 +140,62 @@ else:
 
 UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'docx', 'pdf'}
+ALLOWED_SUFFIXES = tuple('.' + ext for ext in ALLOWED_EXTENSIONS)  # для str.endswith
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 20 * 1024 * 1024  # 20MB max file size
+UPLOAD_COPY_BUFFER = 1024 * 1024  # 1 МБ - размер блока при записи загрузки на диск
 
-if not os.path. exists(UPLOAD_FOLDER):
-    os.makedirs(UPLOAD_FOLDER)
+# Абсолютный путь к папке загрузок вычисляется и создаётся один раз при старте
+UPLOADS_DIR = os.path.join(app.root_path, UPLOAD_FOLDER)
+os.makedirs(UPLOADS_DIR, exist_ok=True)
 
 # Инициализация процессора документов
 doc_processor = DocumentProcessor(dpi=150, max_pages=30)
 
+# Сколько символов текста документа уходит в текстовый анализ
+TEXT_ANALYSIS_LIMIT = 50000
+
+# Фоновые потоки анализа: запрос загрузки только сохраняет файл и ставит задачу в очередь
+ANALYSIS_WORKERS = 2
+analysis_executor = ThreadPoolExecutor(max_workers=ANALYSIS_WORKERS, thread_name_prefix="analysis")
+
+# Статусы загрузки, пока анализ не завершён
+STATUS_QUEUED = 'Очередь'
+STATUS_PROCESSING = 'Обработка'
+UPLOAD_PENDING_STATUSES = (STATUS_QUEUED, STATUS_PROCESSING)
+
 # ============================================================================
 # GEMINI API FUNCTIONS
 # ============================================================================
 
+# Проверка доступности API (список моделей) нужна только для диагностики в логах:
+# выполняется не чаще раза в API_CHECK_TTL секунд, а не перед каждым вызовом модели
+API_CHECK_TTL = 300
+_api_check_expires = 0.0
+
+
+def check_api_availability():
+    """Запрашивает список моделей Gemini и пишет его в лог, если с прошлой проверки прошло API_CHECK_TTL."""
+    global _api_check_expires
+    now = time.monotonic()
+    if now < _api_check_expires:
+        return
+    _api_check_expires = now + API_CHECK_TTL
+    
+    logger.info("🔍 Проверка доступности Gemini API...")
+    test_url = f"{GEMINI_API_BASE_V1BETA}/models?key={GEMINI_API_KEY}"
+    try:
+        test_response = gemini_http.get(test_url, timeout=10)
+        if test_response.status_code == 200:
+            available_models = loads_json(test_response.content).get('models', [])
+            model_names = [m. get('name', '').split('/')[-1] for m in available_models]
+            logger.info("✅ Доступные модели: %s...", ', '.join(model_names[:5]))
+        else:
+            logger.warning("⚠️ Не удалось получить список моделей (код: %s)", test_response.status_code)
+    except Exception as e:
+        logger.warning("⚠️ Ошибка при проверке доступности API: %s", e)
+
+
 def call_gemini_api(prompt, system_instruction=None, max_output_tokens=4000, temperature=0.3):
     """
     Вызывает Google Gemini API с заданным промптом. 
@@ -131,20 +238,9 @@ def call_gemini_api(prompt, system_instruction=None, max_output_tokens=4000, tem
     headers = {
         "Content-Type": "application/json"
     }
+    request_body = dumps_json_bytes(payload)
     
-    # Проверка доступности API
-    print("🔍 Проверка доступности Gemini API...")
-    test_url = f"{GEMINI_API_BASE_V1BETA}/models?key={GEMINI_API_KEY}"
-    try:
-        test_response = requests. get(test_url, timeout=10)
-        if test_response.status_code == 200:
-            available_models = test_response.json(). get('models', [])
-            model_names = [m. get('name', '').split('/')[-1] for m in available_models]
-            print(f"✅ Доступные модели: {', '.join(model_names[:5])}...")
-        else:
-            print(f"⚠️  Не удалось получить список моделей (код: {test_response. status_code})")
-    except Exception as e:
-        print(f"⚠️  Ошибка при проверке доступности API: {e}")
+    check_api_availability()
     
     # Список моделей для попытки (в порядке приоритета)
     models_to_try = [
@@ -163,17 +259,17 @@ def call_gemini_api(prompt, system_instruction=None, max_output_tokens=4000, tem
         for model in models_to_try:
             try:
                 current_url = f"{api_base}/models/{model}:generateContent?key={GEMINI_API_KEY}"
-                print(f"📤 Попытка подключения (API: {api_base. split('/')[-1]}, модель: {model})...")
+                logger.info("📤 Попытка подключения (API: %s, модель: %s)...", api_base.split('/')[-1], model)
             
-                response = requests. post(
+                response = gemini_http.post(
                     current_url,
                     headers=headers,
-                    json=payload,
+                    data=request_body,
                     timeout=120
                 )
                 
                 if response. status_code == 200:
-                    print(f"✅ Успешное подключение к модели: {model}")
+                    logger.info("✅ Успешное подключение к модели: %s", model)
                     last_response = response
                     found_working_model = True
                     break
@@ -185,9 +281,9 @@ def call_gemini_api(prompt, system_instruction=None, max_output_tokens=4000, tem
                         error_detail = error_data.get('error', {}).get('message', '')
                     except:
                         pass
-                    print(f"⚠️  Модель {model} недоступна (404)")
+                    logger.warning("⚠️ Модель %s недоступна (404)", model)
                     if error_detail:
-                        print(f"   Детали ошибки: {error_detail}")
+                        logger.warning("Детали ошибки: %s", error_detail)
                     last_error = f"Модель {model} не найдена (404)"
                     continue
                 
@@ -207,7 +303,7 @@ def call_gemini_api(prompt, system_instruction=None, max_output_tokens=4000, tem
                 continue
                 
             except requests.exceptions.RequestException as e:
-                print(f"⚠️  Ошибка при запросе к модели {model}: {e}")
+                logger.warning("⚠️ Ошибка при запросе к модели %s: %s", model, e)
                 last_error = str(e)
                 continue
         
@@ -248,7 +344,7 @@ def call_gemini_api(prompt, system_instruction=None, max_output_tokens=4000, tem
     
     try:
         response. raise_for_status()
-        data = response.json()
+        data = loads_json(response.content)
         
         if 'candidates' in data and len(data['candidates']) > 0:
             candidate = data['candidates'][0]
@@ -257,7 +353,7 @@ def call_gemini_api(prompt, system_instruction=None, max_output_tokens=4000, tem
                 if len(parts) > 0 and 'text' in parts[0]:
                     content = parts[0]['text']
                     if content:
-                        print(f"✅ Получен ответ от Gemini API ({len(content)} символов)")
+                        logger.info("✅ Получен ответ от Gemini API (%s символов)", len(content))
                         return content
                     else:
                         raise ValueError("Пустой ответ от API")
@@ -288,7 +384,8 @@ def call_gemini_api(prompt, system_instruction=None, max_output_tokens=4000, tem
 def call_gemini_api_with_images(prompt: str, system_instruction: str, 
                                  images_base64: List[str], 
                                  max_output_tokens: int = 8000,
-                                 temperature: float = 0.1) -> str:
+                                 temperature: float = 0.1,
+                                 mime_type: str = "image/jpeg") -> str:
     """
     Вызывает Gemini API с изображениями. 
     
@@ -298,6 +395,7 @@ def call_gemini_api_with_images(prompt: str, system_instruction: str,
         images_base64: Список base64 закодированных изображений
         max_output_tokens: Максимальное количество токенов в ответе
         temperature: Температура генерации
+        mime_type: MIME-тип изображений (DocumentProcessor по умолчанию выдаёт JPEG)
         
     Returns:
         Ответ от API
@@ -313,11 +411,11 @@ def call_gemini_api_with_images(prompt: str, system_instruction: str,
     for i, img_base64 in enumerate(images_base64[:max_images]):
         parts.append({
             "inline_data": {
-                "mime_type": "image/png",
+                "mime_type": mime_type,
                 "data": img_base64
             }
         })
-        print(f"📷 Добавлено изображение {i + 1}/{max_images}")
+        logger.debug("📷 Добавлено изображение %s/%s", i + 1, max_images)
     
     # Добавляем текстовый промпт
     parts.append({"text": prompt})
@@ -336,6 +434,8 @@ def call_gemini_api_with_images(prompt: str, system_instruction: str,
         payload["systemInstruction"] = {"parts": [{"text": system_instruction}]}
     
     headers = {"Content-Type": "application/json"}
+    # Тело сериализуется один раз, а не на каждую попытку (base64 изображений - мегабайты)
+    request_body = dumps_json_bytes(payload)
     
     # Используем модели с поддержкой vision
     models_to_try = ["gemini-2.0-flash"]
@@ -348,19 +448,19 @@ def call_gemini_api_with_images(prompt: str, system_instruction: str,
         for model in models_to_try:
             try:
                 current_url = f"{api_base}/models/{model}:generateContent?key={GEMINI_API_KEY}"
-                print(f"📤 Попытка с изображениями: {model}...")
+                logger.info("📤 Попытка с изображениями: %s...", model)
                 
-                response = requests.post(current_url, headers=headers, json=payload, timeout=180)
+                response = gemini_http.post(current_url, headers=headers, data=request_body, timeout=180)
                 
                 if response.status_code == 200:
-                    print(f"✅ Успешно: {model}")
+                    logger.info("✅ Успешно: %s", model)
                     last_response = response
                     break
                 else:
                     last_error = f"Код {response.status_code}"
                     
             except requests.exceptions. RequestException as e:
-                print(f"⚠️ Ошибка: {e}")
+                logger.warning("⚠️ Ошибка: %s", e)
                 last_error = str(e)
                 continue
         
@@ -371,20 +471,58 @@ def call_gemini_api_with_images(prompt: str, system_instruction: str,
         raise ValueError(f"Не удалось отправить изображения в Gemini API: {last_error}")
     
     try:
-        data = last_response. json()
+        data = loads_json(last_response.content)
         if 'candidates' in data and len(data['candidates']) > 0:
             candidate = data['candidates'][0]
             if 'content' in candidate and 'parts' in candidate['content']:
                 parts = candidate['content']['parts']
                 if len(parts) > 0 and 'text' in parts[0]:
                     content = parts[0]['text']
-                    print(f"✅ Получен ответ ({len(content)} символов)")
+                    logger.info("✅ Получен ответ (%s символов)", len(content))
                     return content
         raise ValueError("Неожиданный формат ответа")
     except Exception as e:
         raise ValueError(f"Ошибка обработки ответа: {e}")
 
 
+def dumps_json_bytes(data) -> bytes:
+    """Сериализует данные в JSON (UTF-8 байты), через orjson если он установлен."""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+
+def loads_json(data):
+    """Разбирает JSON из строки или байтов, через orjson если он установлен."""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+REPORT_ZSTD_LEVEL = 3
+
+
+def pack_report(report: dict) -> Tuple[Optional[str], Optional[bytes]]:
+    """
+    Готовит отчёт к записи в БД.
+    
+    Returns:
+        Кортеж (report_json, report_zstd): при установленном zstandard заполнено
+        только сжатое поле, иначе только текстовое
+    """
+    data = dumps_json_bytes(report)
+    if ZSTD_AVAILABLE:
+        return None, zstandard.compress(data, REPORT_ZSTD_LEVEL)
+    return data.decode('utf-8'), None
+
+
+def unpack_report(report_json: Optional[str], report_zstd: Optional[bytes]):
+    """Разбирает отчёт, сохранённый pack_report (или старый текстовый report_json)."""
+    if report_zstd is not None:
+        return loads_json(zstandard.decompress(report_zstd))
+    return loads_json(report_json)
+
+
 def clean_json_response(text):
     """Очищает JSON ответ от markdown обёрток и лишних символов."""
     if not text:
@@ -420,11 +558,11 @@ def clean_json_response(text):
 def analyze_document_with_images(file_path: str, gost_name: str) -> dict:
     """Анализирует документ через преобразование в изображения."""
     try:
-        print(f"🖼️ Начинаем обработку документа через изображения: {file_path}")
+        logger.info("🖼️ Начинаем обработку документа через изображения: %s", file_path)
         
         # Преобразуем документ в изображения
         images, base64_images = doc_processor.process_document(file_path)
-        print(f"✅ Документ преобразован в {len(images)} изображений")
+        logger.info("✅ Документ преобразован в %s изображений", len(images))
         
         if not base64_images:
             return {
@@ -439,7 +577,7 @@ def analyze_document_with_images(file_path: str, gost_name: str) -> dict:
             return analyze_bibliography_from_images(base64_images, gost_name)
             
     except Exception as e:
-        print(f"❌ Ошибка при анализе документа: {e}")
+        logger.error("❌ Ошибка при анализе документа: %s", e)
         import traceback
         traceback.print_exc()
         return {
@@ -564,7 +702,7 @@ def analyze_structure_from_images(images_base64: List[str], gost_name: str) -> d
     try:
         response_text = call_gemini_api_with_images(prompt, system_instruction, images_base64)
         cleaned_response = clean_json_response(response_text)
-        result = json.loads(cleaned_response)
+        result = loads_json(cleaned_response)
         
         # Нормализация
         result. setdefault('success', True)
@@ -648,7 +786,7 @@ def analyze_bibliography_from_images(images_base64: List[str], gost_name: str) -
     try:
         response_text = call_gemini_api_with_images(prompt, system_instruction, images_base64)
         cleaned_response = clean_json_response(response_text)
-        result = json.loads(cleaned_response)
+        result = loads_json(cleaned_response)
         
         # Нормализация
         result.setdefault('success', True)
@@ -692,9 +830,9 @@ def analyze_document_with_gost(text_content, gost_name="ГОСТ Р 7.0.5-2008")
 2. Каждую ссылку проверяй отдельно и относи к соответствующей категории
 3.  Для неправильных ссылок ОБЯЗАТЕЛЬНО указывай конкретные ошибки и исправленный вариант"""
 
-    text_for_analysis = text_content[:50000]
-    if len(text_content) > 50000:
-        print(f"Текст обрезан с {len(text_content)} до 50000 символов")
+    text_for_analysis = text_content[:TEXT_ANALYSIS_LIMIT]
+    if len(text_content) > TEXT_ANALYSIS_LIMIT:
+        logger.info("Текст обрезан с %s до %s символов", len(text_content), TEXT_ANALYSIS_LIMIT)
 
     prompt = f"""Проанализируй текст документа и найди в нём все библиографические ссылки. 
 
@@ -857,7 +995,7 @@ def analyze_document_with_gost(text_content, gost_name="ГОСТ Р 7.0.5-2008")
         cleaned_response = clean_json_response(response_text)
         
         try:
-            result = json.loads(cleaned_response)
+            result = loads_json(cleaned_response)
             
             if not isinstance(result, dict):
                 raise ValueError("Ответ не является JSON объектом")
@@ -880,8 +1018,8 @@ def analyze_document_with_gost(text_content, gost_name="ГОСТ Р 7.0.5-2008")
             return result
             
         except json.JSONDecodeError as e:
-            print(f"Ошибка парсинга JSON: {e}")
-            print(f"Первые 500 символов ответа: {cleaned_response[:500]}")
+            logger.warning("Ошибка парсинга JSON: %s", e)
+            logger.warning("Первые 500 символов ответа: %s", cleaned_response[:500])
             return {
                 "success": False,
                 "total_found": 0,
@@ -896,7 +1034,7 @@ def analyze_document_with_gost(text_content, gost_name="ГОСТ Р 7.0.5-2008")
             }
             
     except Exception as e:
-        print(f"Ошибка при анализе документа: {e}")
+        logger.error("Ошибка при анализе документа: %s", e)
         return {
             "success": False,
             "total_found": 0,
@@ -924,7 +1062,7 @@ def analyze_document_structure_gost_732(text_content):
 3.  Проверяй наличие всех структурных элементов
 4. Указывай конкретные замечания и рекомендации"""
 
-    text_for_analysis = text_content[:50000]
+    text_for_analysis = text_content[:TEXT_ANALYSIS_LIMIT]
 
     prompt = f"""Проанализируй структуру и оформление документа на соответствие ГОСТ 7.32-2001. 
 
@@ -1099,7 +1237,7 @@ def analyze_document_structure_gost_732(text_content):
         cleaned_response = clean_json_response(response_text)
         
         try:
-            result = json.loads(cleaned_response)
+            result = loads_json(cleaned_response)
             
             if not isinstance(result, dict):
                 raise ValueError("Ответ не является JSON объектом")
@@ -1126,7 +1264,7 @@ def analyze_document_structure_gost_732(text_content):
             return result
             
         except json.JSONDecodeError as e:
-            print(f"Ошибка парсинга JSON: {e}")
+            logger.warning("Ошибка парсинга JSON: %s", e)
             return {
                 "success": False,
                 "document_type": "не определён",
@@ -1143,7 +1281,7 @@ def analyze_document_structure_gost_732(text_content):
             }
             
     except Exception as e:
-        print(f"Ошибка при анализе документа: {e}")
+        logger.error("Ошибка при анализе документа: %s", e)
         return {
             "success": False,
             "document_type": "не определён",
@@ -1163,30 +1301,39 @@ def analyze_document_structure_gost_732(text_content):
 # MAIN ANALYSIS FUNCTION
 # ============================================================================
 
-def analyze_document(file_path: str, text_content: str, gost_id: int, db_session) -> dict:
+def analyze_document(file_path: str, text_content: Optional[str], gost_name: Optional[str]) -> dict:
     """
     Главная функция анализа документа. 
     Выбирает метод анализа в зависимости от типа файла и ГОСТа. 
     Сначала пробует анализ через изображения, затем текстовый анализ.
+    Работает без сессии БД: вызов модели длится десятки секунд, и соединение
+    пула всё это время было бы занято.
+    
+    Args:
+        file_path: Путь к файлу
+        text_content: Текст документа; None - извлечь из файла, только если
+            понадобится текстовый анализ (анализ по изображениям текст не использует)
+        gost_name: Название ГОСТа (None - ГОСТ Р 7.0.5-2008)
     """
-    gost = db_session.query(GOST).filter_by(id=gost_id).one_or_none() if gost_id else None
-    gost_name = gost.name if gost else "ГОСТ Р 7.0.5-2008"
+    gost_name = gost_name or "ГОСТ Р 7.0.5-2008"
     
     file_ext = os.path.splitext(file_path)[1].lower()
     
     # Для PDF и DOCX пробуем анализ через изображения
-    if file_ext in ['.pdf', '. docx', '.doc'] and PYMUPDF_AVAILABLE:
+    if file_ext in ['.pdf', '.docx', '.doc'] and PYMUPDF_AVAILABLE:
         try:
-            print(f"🖼️ Используем анализ через изображения для {file_ext}")
+            logger.info("🖼️ Используем анализ через изображения для %s", file_ext)
             result = analyze_document_with_images(file_path, gost_name)
             if result. get('success'):
                 return result
-            print(f"⚠️ Анализ через изображения не удался, пробуем текстовый анализ...")
+            logger.warning("⚠️ Анализ через изображения не удался, пробуем текстовый анализ...")
         except Exception as e:
-            print(f"⚠️ Ошибка анализа через изображения: {e}")
+            logger.warning("⚠️ Ошибка анализа через изображения: %s", e)
     
     # Запасной вариант - текстовый анализ
-    print(f"📝 Используем текстовый анализ")
+    logger.info("📝 Используем текстовый анализ")
+    if text_content is None:
+        text_content = extract_document_text(file_path)
     if "7.32" in gost_name:
         return analyze_document_structure_gost_732(text_content)
     else:
@@ -1199,7 +1346,103 @@ def analyze_document(file_path: str, text_content: str, gost_id: int, db_session
 
 def allowed_file(filename):
     """Проверяет, разрешено ли расширение файла."""
-    return '.' in filename and filename. rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    return filename.lower().endswith(ALLOWED_SUFFIXES)
+
+
+def validate_upload_request():
+    """
+    Проверяет форму загрузки файла на проверку.
+    Настройка API проверяется первой: она не требует разбора тела запроса,
+    и при ненастроенном API файл не читается вовсе.
+    
+    Returns:
+        Кортеж (FileStorage, gost_id)
+        
+    Raises:
+        ValueError: С сообщением для пользователя, если форма заполнена неверно
+    """
+    if not IS_API_CONFIGURED:
+        raise ValueError('Ошибка: API ключ Google Gemini не настроен')
+    
+    # ИСПРАВЛЕНО: ищем 'file_upload' вместо 'file'
+    file = request.files.get('file_upload')
+    if file is None:
+        raise ValueError('Файл не найден в запросе')
+    if not file.filename:
+        raise ValueError('Файл не выбран')
+    if not allowed_file(file.filename):
+        raise ValueError('Неподдерживаемый формат файла. Разрешены: .pdf, .docx')
+    
+    # ИСПРАВЛЕНО: получаем gost_id по правильному имени поля 'gost_select'
+    gost_id = request.form.get('gost_select', type=int)
+    if not gost_id:
+        raise ValueError('Выберите стандарт (ГОСТ)')
+    
+    return file, gost_id
+
+
+def save_upload(file, file_ext):
+    """
+    Сохраняет загруженный файл в UPLOADS_DIR блоками по UPLOAD_COPY_BUFFER
+    (FileStorage.save копирует блоками по 16 КБ) и попутно считает хеш содержимого.
+    Имя файла - хеш содержимого: одинаковые файлы хранятся на диске один раз.
+    
+    Args:
+        file: Объект FileStorage из request.files
+        file_ext: Расширение файла с точкой ('.pdf', '.docx')
+        
+    Returns:
+        Кортеж (хеш содержимого, имя сохранённого файла)
+    """
+    # Хеш известен только после записи: пишем во временный файл и переименовываем.
+    # Уже сохранённый файл с тем же хешем не трогаем - его может читать идущий анализ
+    hasher = hashlib.blake2b(digest_size=16)
+    with tempfile.NamedTemporaryFile('wb', dir=UPLOADS_DIR, suffix=file_ext,
+                                     buffering=UPLOAD_COPY_BUFFER, delete=False) as dst:
+        try:
+            while True:
+                chunk = file.stream.read(UPLOAD_COPY_BUFFER)
+                if not chunk:
+                    break
+                hasher.update(chunk)
+                dst.write(chunk)
+        except Exception:
+            # Обрыв загрузки - недописанный временный файл не оставляем
+            dst.close()
+            os.remove(dst.name)
+            raise
+    digest = hasher.hexdigest()
+    stored_name = digest + file_ext
+    stored_path = os.path.join(UPLOADS_DIR, stored_name)
+    if os.path.exists(stored_path):
+        os.remove(dst.name)
+    else:
+        # os.replace атомарен: при одновременной загрузке одинаковых файлов
+        # читатели видят либо старую, либо новую (идентичную) копию целиком
+        os.replace(dst.name, stored_path)
+    return digest, stored_name
+
+
+def get_cached_report(db_session, digest: str, gost_id: int):
+    """
+    Возвращает готовый отчёт для файла с тем же содержимым и ГОСТом.
+    
+    Returns:
+        Строка (report_json, report_zstd) или None, если такой файл ещё не проверялся
+    """
+    return db_session.query(AnalysisCache.report_json, AnalysisCache.report_zstd).filter_by(
+        content_hash=digest, gost_id=gost_id).first()
+
+
+def save_cached_report(db_session, digest: str, gost_id: int, report_json: Optional[str],
+                       report_zstd: Optional[bytes]):
+    """Сохраняет успешный отчёт в кэш (если параллельная задача уже сохранила его - ничего не делает)."""
+    db_session.add(AnalysisCache(content_hash=digest, gost_id=gost_id,
+                                 report_json=report_json, report_zstd=report_zstd))
+    try:
+        db_session.commit()
+    except IntegrityError:
+        db_session.rollback()
 
 
 def read_file_content(file_path):
@@ -1214,7 +1457,7 @@ def read_file_content(file_path):
     """
     try:
         if not os.path.exists(file_path):
-            print(f"❌ Файл не найден: {file_path}")
+            logger.error("❌ Файл не найден: %s", file_path)
             return None
         
         ext = os.path. splitext(file_path)[1].lower()
@@ -1230,10 +1473,10 @@ def read_file_content(file_path):
                     doc.close()
                     text = '\n'.join(text_parts)
                     if text. strip():
-                        print(f"✅ PDF прочитан через PyMuPDF: {len(text)} символов")
+                        logger.info("✅ PDF прочитан через PyMuPDF: %s символов", len(text))
                         return text
                 except Exception as e:
-                    print(f"⚠️ Ошибка PyMuPDF: {e}")
+                    logger.warning("⚠️ Ошибка PyMuPDF: %s", e)
             
             # Запасной вариант - PyPDF2
             if PYPDF2_AVAILABLE:
@@ -1241,7 +1484,7 @@ def read_file_content(file_path):
                     with open(file_path, 'rb') as f:
                         reader = PyPDF2. PdfReader(f)
                         if len(reader.pages) == 0:
-                            print("⚠️ PDF файл не содержит страниц")
+                            logger.warning("⚠️ PDF файл не содержит страниц")
                             return None
                         
                         text_parts = []
@@ -1251,18 +1494,18 @@ def read_file_content(file_path):
                                 if page_text:
                                     text_parts. append(page_text)
                             except Exception as e:
-                                print(f"⚠️ Ошибка чтения страницы {page_num}: {e}")
+                                logger.warning("⚠️ Ошибка чтения страницы %s: %s", page_num, e)
                         
                         if not text_parts:
-                            print("⚠️ Не удалось извлечь текст из PDF")
+                            logger.warning("⚠️ Не удалось извлечь текст из PDF")
                             return None
                         
                         text = '\n'.join(text_parts)
-                        print(f"✅ PDF прочитан через PyPDF2: {len(text)} символов, {len(reader.pages)} страниц")
+                        logger.info("✅ PDF прочитан через PyPDF2: %s символов, %s страниц", len(text), len(reader.pages))
                         return text
                         
                 except Exception as pdf_err:
-                    print(f"❌ Ошибка чтения PDF: {pdf_err}")
+                    logger.error("❌ Ошибка чтения PDF: %s", pdf_err)
                     return None
         
         elif ext == '.docx' and DOCX_AVAILABLE:
@@ -1274,38 +1517,242 @@ def read_file_content(file_path):
                         paragraphs.append(para.text)
                 
                 if not paragraphs:
-                    print("⚠️ DOCX файл не содержит текста")
+                    logger.warning("⚠️ DOCX файл не содержит текста")
                     return None
                 
                 text = '\n'.join(paragraphs)
-                print(f"✅ DOCX прочитан: {len(text)} символов, {len(paragraphs)} параграфов")
+                logger.info("✅ DOCX прочитан: %s символов, %s параграфов", len(text), len(paragraphs))
                 return text
                 
             except Exception as docx_err:
-                print(f"❌ Ошибка чтения DOCX: {docx_err}")
+                logger.error("❌ Ошибка чтения DOCX: %s", docx_err)
                 return None
         
         else:
-            print(f"⚠️ Неподдерживаемый формат файла: {ext}")
+            logger.warning("⚠️ Неподдерживаемый формат файла: %s", ext)
             return None
             
     except Exception as e:
-        print(f"❌ Неожиданная ошибка чтения файла: {e}")
+        logger.error("❌ Неожиданная ошибка чтения файла: %s", e)
         import traceback
         traceback.print_exc()
         return None
 
 
+def extract_pdf_text(doc, max_chars: int = TEXT_ANALYSIS_LIMIT) -> str:
+    """
+    Извлекает текст PDF постранично и останавливается, когда набрано max_chars
+    символов: всё, что дальше, текстовый анализ всё равно отрезает.
+    
+    Args:
+        doc: Открытый документ PyMuPDF
+        max_chars: Сколько символов достаточно
+        
+    Returns:
+        Текст страниц через перевод строки
+    """
+    parts = []
+    total = 0
+    for page in doc:
+        text = page.get_text("text")
+        parts.append(text)
+        total += len(text) + 1
+        if total >= max_chars:
+            break
+    return '\n'.join(parts)
+
+
+def extract_document_text(file_path: str) -> str:
+    """
+    Извлекает текст документа для текстового анализа.
+    
+    Args:
+        file_path: Путь к файлу
+        
+    Returns:
+        Текст документа или пустая строка, если формат не поддерживается
+    """
+    file_ext = os.path.splitext(file_path)[1].lower()
+    text_content = ""
+    
+    if file_ext == '.txt':
+        with open(file_path, 'r', encoding='utf-8') as f:
+            text_content = f.read()
+    elif file_ext == '.docx' and DOCX_AVAILABLE:
+        try:
+            doc = docx.Document(file_path)
+            text_content = '\n'.join([para.text for para in doc.paragraphs])
+        except Exception as e:
+            logger.warning("⚠️ Ошибка чтения DOCX: %s", e)
+    elif file_ext == '.pdf' and PYMUPDF_AVAILABLE:
+        try:
+            doc = fitz.open(file_path)
+            text_content = extract_pdf_text(doc)
+            doc.close()
+        except Exception as e:
+            logger.warning("⚠️ Ошибка чтения PDF: %s", e)
+    
+    return text_content
+
+
+def run_analysis(upload_id: int, digest: str = None):
+    """
+    Фоновая задача: анализирует документ и сохраняет отчёт.
+    Выполняется в analysis_executor; сессии БД открываются только на чтение записи
+    и на сохранение результата, во время вызова модели соединение не занято.
+    
+    Args:
+        upload_id: ID записи UserUpload
+        digest: Хеш содержимого файла - успешный отчёт сохраняется в кэш под ним
+    """
+    # Задача выполняется в пуле, её Future никто не читает: любое исключение
+    # должно попасть в лог и в статус записи, иначе она навсегда останется в очереди
+    gost_id = None
+    try:
+        with get_session() as db:
+            upload = db.get(UserUpload, upload_id, options=[joinedload(UserUpload.gost)])
+            if not upload:
+                logger.warning("⚠️ Загрузка %s не найдена", upload_id)
+                return
+            
+            upload.status = STATUS_PROCESSING
+            file_path = os.path.join(UPLOADS_DIR, upload.file_path)
+            filename = upload.filename
+            gost_id = upload.gost_id
+            gost_name = upload.gost.name if upload.gost else None
+            db.commit()
+        
+        # Анализируем документ; текст извлекается внутри только для текстового анализа
+        logger.debug("🔍 Начинаем анализ файла: %s, ГОСТ ID: %s", filename, gost_id)
+        analysis_result = analyze_document(file_path, None, gost_name)
+        logger.debug("✅ Результат анализа: success=%s", analysis_result.get('success'))
+        
+        status = 'Проверено' if analysis_result.get('success') else 'Ошибка'
+        report_json, report_zstd = pack_report({'gost_processing': analysis_result})
+    except Exception as e:
+        logger.exception("❌ Ошибка при обработке файла: %s", e)
+        status = 'Ошибка'
+        report_json, report_zstd = pack_report({'gost_processing': {'success': False, 'error': str(e)}})
+    
+    # Результат записывается одним UPDATE в новой короткой транзакции
+    try:
+        with get_session() as db:
+            db.query(UserUpload).filter_by(id=upload_id).update(
+                {UserUpload.status: status, UserUpload.report_json: report_json,
+                 UserUpload.report_zstd: report_zstd},
+                synchronize_session=False)
+            db.commit()
+            logger.debug("✅ Сохранено в БД, ID: %s", upload_id)
+            
+            if digest and gost_id and status == 'Проверено':
+                save_cached_report(db, digest, gost_id, report_json, report_zstd)
+    except Exception as e:
+        logger.exception("❌ Не удалось сохранить результат анализа %s: %s", upload_id, e)
+
+
+def fail_interrupted_uploads():
+    """
+    Помечает ошибкой загрузки, оставшиеся в очереди или в обработке с прошлого запуска.
+    Очередь analysis_executor живёт только в памяти процесса: после перезапуска
+    эти задачи уже никто не выполнит, а страница файла ждала бы их бесконечно.
+    
+    Returns:
+        Количество помеченных записей
+    """
+    report_json, report_zstd = pack_report({'gost_processing': {
+        'success': False, 'error': 'Анализ прерван перезапуском сервера. Загрузите файл повторно.'}})
+    with get_session() as db:
+        count = db.query(UserUpload).filter(UserUpload.status.in_(UPLOAD_PENDING_STATUSES)).update(
+            {UserUpload.status: 'Ошибка', UserUpload.report_json: report_json,
+             UserUpload.report_zstd: report_zstd},
+            synchronize_session=False)
+        db.commit()
+    if count:
+        logger.warning("⚠️ Прерванных перезапуском загрузок: %s, помечены как ошибка", count)
+    return count
+
+
 # ============================================================================
 # DATABASE HELPERS
 # ============================================================================
 
+# Колонки, нужные спискам работ в личных кабинетах (report_json не загружаем)
+UPLOAD_LIST_COLUMNS = (UserUpload.id, UserUpload.filename, UserUpload.status, UserUpload.upload_date)
+
+
+# Кэш активных ключей компаний: key_value -> (company_id, время истечения).
+# Кэшируются только найденные ключи; отозванный ключ перестаёт действовать не позже чем через TTL
+COMPANY_KEY_CACHE_TTL = 600
+_company_key_cache = {}
+
+
+def get_company_id_by_key(db_session, key_value):
+    """
+    Возвращает id компании для активного ключа.
+    
+    Args:
+        db_session: Сессия БД
+        key_value: Значение ключа компании
+        
+    Returns:
+        company_id или None, если ключ не найден или неактивен
+    """
+    if not key_value:
+        return None
+    
+    cached = _company_key_cache.get(key_value)
+    if cached and cached[1] > time.monotonic():
+        return cached[0]
+    
+    row = db_session.query(KeyCompany.company_id).filter_by(key_value=key_value, is_active=True).first()
+    if row is None:
+        _company_key_cache.pop(key_value, None)
+        return None
+    
+    _company_key_cache[key_value] = (row.company_id, time.monotonic() + COMPANY_KEY_CACHE_TTL)
+    return row.company_id
+
+
+# Списки ГОСТов для формы проверки: client_type -> (строки (id, name), время истечения).
+# ГОСТы меняются редко (update_gosts.py), новые появятся в форме не позже чем через TTL
+GOST_LIST_CACHE_TTL = 300
+_gost_list_cache = {}
+
+
+def get_available_gosts(db_session, client_type):
+    """
+    Возвращает ГОСТы, доступные пользователю данного типа (только id и name).
+    
+    Args:
+        db_session: Сессия БД
+        client_type: Тип клиента ('private' или 'company')
+        
+    Returns:
+        Список строк с полями id и name
+    """
+    cached = _gost_list_cache.get(client_type)
+    if cached and cached[1] > time.monotonic():
+        return cached[0]
+    
+    query = db_session.query(GOST.id, GOST.name)
+    if client_type != 'company':
+        query = query.filter_by(client_type_for='all')
+    gosts = query.all()
+    
+    _gost_list_cache[client_type] = (gosts, time.monotonic() + GOST_LIST_CACHE_TTL)
+    return gosts
+
+
 def get_current_user(db_session):
-    """Получает текущего пользователя из сессии."""
+    """Получает текущего пользователя из сессии (загружается один раз за запрос)."""
+    if 'current_user' in g:
+        return g.current_user
+    
     user_id = session.get('user_id')
-    if user_id:
-        return db_session.query(User). get(user_id)
-    return None
+    # Session.get сначала смотрит в identity map сессии и идёт в БД только при промахе
+    user = db_session.get(User, user_id) if user_id else None
+    g.current_user = user
+    return user
 
 
 # ============================================================================
@@ -1318,6 +1765,15 @@ def before_request():
     g.db_session = get_session()
 
 
+@app.after_request
+def after_request(response):
+    """HTML-страницы зависят от пользователя: кэшируются только браузером и с перепроверкой."""
+    if response.mimetype == 'text/html' and 'Cache-Control' not in response.headers:
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.vary.add('Cookie')
+    return response
+
+
 @app.teardown_request
 def teardown_request(exception):
     """Закрывает сессию БД после запроса."""
@@ -1343,20 +1799,24 @@ def login():
         client_type = request.form.get('client_type')
         company_key = request.form.get('company_key')
 
-        user = db.query(User).filter_by(login=login_input, client_type=client_type).one_or_none()
+        # Для входа нужны только эти колонки; при промахе хеш всё равно считается
+        user = db.query(User).options(
+            load_only(User.id, User.login, User.password_hash, User.client_type, User.company_id)
+        ).filter_by(login=login_input, client_type=client_type).one_or_none()
+        password_ok = user.check_password(password) if user else User.dummy_check(password)
         
-        if user and user.check_password(password):
+        if password_ok:
             valid = True
             if client_type == 'company':
-                key_obj = db.query(KeyCompany).filter_by(
-                    key_value=company_key, 
-                    company_id=user.company_id, 
-                    is_active=True
-                ).one_or_none()
-                if not key_obj:
+                key_company_id = get_company_id_by_key(db, company_key)
+                if key_company_id is None or key_company_id != user.company_id:
                     valid = False
             
             if valid:
+                # Старый хеш пароля заменяется на Argon2 при первом успешном входе
+                if user.needs_rehash():
+                    user.set_password(password)
+                    db.commit()
                 session['user_id'] = user.id
                 session['client_type'] = user.client_type
                 flash(f'Добро пожаловать, {user.login}!', 'success')
@@ -1380,20 +1840,23 @@ def registration():
         activity_type = request.form.get('activity_type')
         company_key = request.form.get('company_key')
 
-        if db.query(User).filter_by(login=login_input).count() > 0:
+        # Логин и email проверяем одним запросом; совпадений не больше двух строк
+        conflicts = db.query(User.login, User.email).filter(
+            or_(User.login == login_input, User.email == email)
+        ).limit(2).all()
+        if any(row.login == login_input for row in conflicts):
             flash('Логин занят.', 'error')
             return redirect(url_for('registration'))
-        if db.query(User).filter_by(email=email).count() > 0:
+        if conflicts:
             flash('Email занят.', 'error')
             return redirect(url_for('registration'))
         
         company_id = None
         if client_type == 'company':
-            key_obj = db.query(KeyCompany).filter_by(key_value=company_key, is_active=True).one_or_none()
-            if not key_obj:
+            company_id = get_company_id_by_key(db, company_key)
+            if company_id is None:
                 flash('Неверный ключ компании.', 'error')
                 return redirect(url_for('registration'))
-            company_id = key_obj.company_id
         
         user = User(
             login=login_input, 
@@ -1427,7 +1890,7 @@ def lk_private():
     if user.client_type != 'private':
         return redirect(url_for('lk_company'))
     
-    uploads = db.query(UserUpload).filter_by(user_id=user.id).order_by(UserUpload.upload_date.desc()).all()
+    uploads = db.query(UserUpload).options(load_only(*UPLOAD_LIST_COLUMNS)).filter_by(user_id=user.id).order_by(UserUpload.upload_date.desc()).all()
     return render_template('lk.html', user=user, uploads=uploads)
 
 
@@ -1440,28 +1903,21 @@ def lk_company():
     if user.client_type != 'company':
         return redirect(url_for('lk_private'))
     
-    uploads = db.query(UserUpload).join(User).filter(User.company_id == user.company_id).order_by(UserUpload.upload_date.desc()).all()
+    uploads = db.query(UserUpload).options(load_only(*UPLOAD_LIST_COLUMNS)).join(User).filter(User.company_id == user.company_id).order_by(UserUpload.upload_date.desc()).all()
     return render_template('lk_company.html', user=user, uploads=uploads)
 
 
 @app.route('/check-file', methods=['GET', 'POST'])
 def check_file():
     """Страница загрузки и проверки файла."""
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
-    
-    db = get_session()
-    user = db.query(User).filter_by(id=session['user_id']).one_or_none()
+    db = g.db_session
+    user = get_current_user(db)
     
     if not user:
-        db.close()
         return redirect(url_for('login'))
     
     # Получаем доступные ГОСТы
-    if user.client_type == 'company':
-        gosts = db.query(GOST).all()
-    else:
-        gosts = db.query(GOST).filter_by(client_type_for='all').all()
+    gosts = get_available_gosts(db, user.client_type)
     
     # Для API предупреждения
     api_warning = None
@@ -1469,136 +1925,65 @@ def check_file():
         api_warning = "API ключ не настроен"
     
     if request.method == 'POST':
-        print("📤 Получен POST запрос")
-        print(f"📤 Form data keys: {list(request.form. keys())}")
-        print(f"📤 Files keys: {list(request.files.keys())}")
-        
-        # ИСПРАВЛЕНО: ищем 'file_upload' вместо 'file'
-        if 'file_upload' not in request.files:
-            flash('Файл не найден в запросе', 'error')
-            db.close()
-            return redirect(request.url)
-        
-        file = request.files['file_upload']
-        print(f"📁 Файл: {file.filename}")
-        
-        if file.filename == '' or file.filename is None:
-            flash('Файл не выбран', 'error')
-            db.close()
-            return redirect(request. url)
-        
-        # Проверяем расширение файла
-        if not allowed_file(file.filename):
-            flash('Неподдерживаемый формат файла.  Разрешены: .pdf, . docx', 'error')
-            db.close()
-            return redirect(request.url)
-        
-        # ИСПРАВЛЕНО: получаем gost_id по правильному имени поля 'gost_select'
-        gost_id = request.form.get('gost_select', type=int)
-        print(f"📋 ГОСТ ID: {gost_id}")
-        
-        if not gost_id:
-            flash('Выберите стандарт (ГОСТ)', 'error')
-            db.close()
-            return redirect(request.url)
+        # Отладочный вывод: списки ключей строятся только при включённом DEBUG
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("📤 Получен POST запрос, form: %s, files: %s",
+                         list(request.form.keys()), list(request.files.keys()))
         
-        # Проверка API
-        if not IS_API_CONFIGURED:
-            flash('Ошибка: API ключ Google Gemini не настроен', 'error')
-            db.close()
+        try:
+            file, gost_id = validate_upload_request()
+        except ValueError as e:
+            flash(str(e), 'error')
             return redirect(request.url)
+        logger.debug("📁 Файл: %s, ГОСТ ID: %s", file.filename, gost_id)
         
         # Сохраняем файл
         filename = secure_filename(file.filename)
-        file_ext = os.path.splitext(filename)[1]. lower()
-        unique_filename = f"{uuid.uuid4()}{file_ext}"
-        
-        # Создаём папку uploads если не существует
-        uploads_dir = os. path.join(app.root_path, 'uploads')
-        os.makedirs(uploads_dir, exist_ok=True)
-        
-        file_path = os. path.join(uploads_dir, unique_filename)
-        file.save(file_path)
-        print(f"💾 Файл сохранён: {file_path}")
+        # Расширение берём из исходного имени (его проверил allowed_file):
+        # secure_filename удаляет кириллицу, и от 'отчёт.pdf' остаётся просто 'pdf'
+        file_ext = os.path.splitext(file.filename)[1].lower()
+        digest, unique_filename = save_upload(file, file_ext)
+        logger.debug("💾 Файл сохранён: %s", unique_filename)
         
-        try:
-            # Извлекаем текст
-            text_content = ""
-            
-            if file_ext == '.txt':
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    text_content = f.read()
-            elif file_ext == '. docx' and DOCX_AVAILABLE:
-                try:
-                    doc = docx.Document(file_path)
-                    text_content = '\n'.join([para.text for para in doc.paragraphs])
-                except Exception as e:
-                    print(f"⚠️ Ошибка чтения DOCX: {e}")
-            elif file_ext == '.pdf' and PYMUPDF_AVAILABLE:
-                try:
-                    doc = fitz.open(file_path)
-                    text_content = '\n'.join([page.get_text() for page in doc])
-                    doc.close()
-                except Exception as e:
-                    print(f"⚠️ Ошибка чтения PDF: {e}")
-            
-            # Анализируем документ
-            print(f"🔍 Начинаем анализ файла: {filename}, ГОСТ ID: {gost_id}")
-            analysis_result = analyze_document(file_path, text_content, gost_id, db)
-            print(f"✅ Результат анализа: success={analysis_result. get('success')}")
-            
-            # Сохраняем результат в БД
-            upload = UserUpload(
-                filename=filename,
-                file_path=unique_filename,
-                user_id=user.id,
-                gost_id=gost_id,
-                status='Проверено' if analysis_result. get('success') else 'Ошибка',
-                report_json=json.dumps({'gost_processing': analysis_result}, ensure_ascii=False),
-                upload_date=datetime.now()
-            )
-            db.add(upload)
-            db.commit()
-            
-            upload_id = upload. id
-            print(f"✅ Сохранено в БД, ID: {upload_id}")
-            
-            if analysis_result.get('success'):
-                flash('Файл успешно обработан!', 'success')
-            else:
-                flash(f'Ошибка обработки: {analysis_result.get("error", "Неизвестная ошибка")}', 'error')
-            
-            db.close()
-            return redirect(url_for('process_file', upload_id=upload_id))
-            
-        except Exception as e:
-            print(f"❌ Ошибка при обработке файла: {e}")
-            import traceback
-            traceback.print_exc()
-            
-            # Сохраняем с ошибкой
+        # Тот же файл уже проверялся по этому ГОСТу - берём готовый отчёт без вызова модели
+        cached_report = get_cached_report(db, digest, gost_id)
+        if cached_report is not None:
             upload = UserUpload(
                 filename=filename,
                 file_path=unique_filename,
                 user_id=user.id,
                 gost_id=gost_id,
-                status='Ошибка',
-                report_json=json.dumps({'gost_processing': {'success': False, 'error': str(e)}}, ensure_ascii=False),
-                upload_date=datetime. now()
+                status='Проверено',
+                report_json=cached_report.report_json,
+                report_zstd=cached_report.report_zstd
             )
             db.add(upload)
             db.commit()
-            upload_id = upload. id
-            
-            flash(f'Ошибка обработки файла: {str(e)}', 'error')
-            db.close()
+            logger.debug("♻️ Отчёт для загрузки %s взят из кэша", upload.id)
             
-            return redirect(url_for('process_file', upload_id=upload_id))
+            flash('Файл успешно обработан!', 'success')
+            return redirect(url_for('process_file', upload_id=upload.id))
+        
+        # Запись создаётся сразу со статусом очереди, анализ идёт в фоне
+        upload = UserUpload(
+            filename=filename,
+            file_path=unique_filename,
+            user_id=user.id,
+            gost_id=gost_id,
+            status=STATUS_QUEUED
+        )
+        db.add(upload)
+        db.commit()
+        
+        analysis_executor.submit(run_analysis, upload.id, digest)
+        logger.debug("📥 Загрузка %s поставлена в очередь", upload.id)
+        
+        flash('Файл загружен и поставлен в очередь на проверку.', 'success')
+        return redirect(url_for('process_file', upload_id=upload.id))
     
     # GET запрос - показываем форму
     return_route = url_for('lk_company') if user.client_type == 'company' else url_for('lk_private')
     
-    db.close()
     return render_template('check.html', 
                           user=user, 
                           gosts=gosts, 
@@ -1615,7 +2000,11 @@ def process_file(upload_id):
     if not user:
         return redirect(url_for('login'))
     
-    upload = db.query(UserUpload).filter_by(id=upload_id).one_or_none()
+    # ГОСТ и владелец (для проверки прав) подгружаются тем же запросом через JOIN
+    upload = db.get(UserUpload, upload_id, options=[
+        joinedload(UserUpload.gost),
+        joinedload(UserUpload.user).load_only(User.id, User.company_id),
+    ])
     if not upload:
         return redirect(url_for('lk_private'))
     
@@ -1623,20 +2012,44 @@ def process_file(upload_id):
     if upload.user_id != user.id and not (user.client_type == 'company' and upload.user.company_id == user.company_id):
         return redirect(url_for('lk_private'))
 
-    gost_obj = db.query(GOST).filter_by(id=upload.gost_id).one_or_none()
+    gost_obj = upload.gost
     
     # Парсинг результата
     result = None
-    if upload.report_json:
+    if upload.report_json or upload.report_zstd:
         try:
-            data = json.loads(upload.report_json)
+            data = unpack_report(upload.report_json, upload.report_zstd)
             result = data.get('gost_processing')
         except:
             pass
 
     return_route = url_for('lk_company') if user.client_type == 'company' else url_for('lk_private')
     return render_template('process-file.html', upload=upload, user=user, gost=gost_obj, 
-                         result=result, return_route=return_route)
+                         result=result, return_route=return_route,
+                         pending_statuses=UPLOAD_PENDING_STATUSES)
+
+
+@app.route('/upload-status/<int:upload_id>')
+def upload_status(upload_id):
+    """Статус обработки загрузки в JSON (для опроса со страницы результата)."""
+    db = g.db_session
+    user = get_current_user(db)
+    if not user:
+        return jsonify({'error': 'unauthorized'}), 401
+    
+    upload = db.get(UserUpload, upload_id, options=[
+        load_only(UserUpload.id, UserUpload.user_id, UserUpload.status),
+        joinedload(UserUpload.user).load_only(User.id, User.company_id),
+    ])
+    if not upload or (upload.user_id != user.id and not (
+            user.client_type == 'company' and upload.user.company_id == user.company_id)):
+        return jsonify({'error': 'not found'}), 404
+    
+    return jsonify({
+        'id': upload.id,
+        'status': upload.status,
+        'done': upload.status not in UPLOAD_PENDING_STATUSES
+    })
 
 
 @app.route('/work-details/<int:upload_id>')
@@ -1664,6 +2077,14 @@ def logout():
     return redirect(url_for('login'))
 
 
+# Задачи прошлого процесса потеряны вместе с его очередью
+try:
+    fail_interrupted_uploads()
+except SQLAlchemyError as e:
+    # БД ещё не создана - её создаст initialize_database()
+    logger.debug("БД недоступна при проверке прерванных загрузок: %s", e)
+
+
 if __name__ == '__main__':
     print("\n" + "="*60)
     print("🚀 Запуск WorkWise Application")
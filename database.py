@@ -1,19 +1,62 @@
 # database.py - ИСПРАВЛЕННЫЙ И ДОПОЛНЕННЫЙ КОД ДЛЯ MVP
 
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, ForeignKey, DateTime, Text
+from sqlalchemy import create_engine, event, Column, Integer, String, Boolean, ForeignKey, DateTime, Text, LargeBinary, Index, text
 from sqlalchemy.orm import sessionmaker, relationship
 from sqlalchemy.ext.declarative import declarative_base
-from datetime import datetime
 import hashlib
+import hmac
 import json 
 import os
 import uuid 
 
+# Хеширование паролей Argon2id (необязательно), иначе прежний sha256
+try:
+    from argon2 import PasswordHasher
+    from argon2.exceptions import VerificationError, InvalidHashError
+    # Один экземпляр на процесс; параметры дают ~100 мс на проверку
+    _password_hasher = PasswordHasher(time_cost=2, memory_cost=64 * 1024, parallelism=2)
+    ARGON2_AVAILABLE = True
+except ImportError:
+    ARGON2_AVAILABLE = False
+    print("⚠️ argon2-cffi не установлен. Установите: pip install argon2-cffi")
+
 # --- 1. Инициализация базы данных ---
 DATABASE_URL = "sqlite:///workwise.db"
-engine = create_engine(DATABASE_URL)
+
+
+def _create_engine():
+    """Создаёт engine с пулом соединений, рассчитанным на потоки веб-сервера."""
+    new_engine = create_engine(
+        DATABASE_URL,
+        pool_size=20,
+        max_overflow=30,
+        pool_pre_ping=True,   # дешёвая проверка соединения при выдаче из пула
+        pool_recycle=3600,
+        pool_timeout=30,
+    )
+    event.listen(new_engine, "connect", _set_sqlite_pragmas)
+    return new_engine
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    Настраивает каждое новое соединение SQLite: в режиме WAL читатели не блокируют
+    запись, поэтому соединения пула работают параллельно; synchronous=NORMAL
+    для WAL безопасен и не делает fsync на каждый коммит.
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
+engine = _create_engine()
 Base = declarative_base()
 
+# Текущее локальное время на стороне SQLite (CURRENT_TIMESTAMP/func.now() дают UTC,
+# а шаблоны выводят дату без перевода часового пояса, как прежний datetime.now())
+LOCAL_NOW = text("(datetime('now', 'localtime'))")
+
 # --- 2. Модели (Таблицы) ---
 
 # 2.1. Company
@@ -59,10 +102,44 @@ class User(Base):
     uploads = relationship("UserUpload", back_populates="user", order_by="UserUpload.upload_date.desc()")
     
     def set_password(self, password):
-        self.password_hash = hashlib.sha256(password.encode('utf-8')).hexdigest()
+        self.password_hash = _hash_password(password)
         
     def check_password(self, password):
-        return self.password_hash == hashlib.sha256(password.encode('utf-8')).hexdigest()
+        if self.password_hash.startswith('$argon2'):
+            if not ARGON2_AVAILABLE:
+                return False
+            try:
+                return _password_hasher.verify(self.password_hash, password)
+            except (VerificationError, InvalidHashError):
+                return False
+        # Старые хеши sha256, созданные до перехода на Argon2
+        return hmac.compare_digest(self.password_hash, _legacy_hash_password(password))
+
+    def needs_rehash(self):
+        """Проверяет, нужно ли пересчитать хеш (старый sha256 или устаревшие параметры Argon2)."""
+        if not ARGON2_AVAILABLE:
+            return False
+        if not self.password_hash.startswith('$argon2'):
+            return True
+        return _password_hasher.check_needs_rehash(self.password_hash)
+
+    @staticmethod
+    def dummy_check(password):
+        """Хеширует пароль вхолостую, чтобы время ответа для несуществующего логина не отличалось."""
+        _hash_password(password)
+        return False
+
+
+def _hash_password(password):
+    """Возвращает хеш пароля в формате, хранимом в User.password_hash."""
+    if ARGON2_AVAILABLE:
+        return _password_hasher.hash(password)
+    return _legacy_hash_password(password)
+
+
+def _legacy_hash_password(password):
+    """Прежний формат хеша пароля (sha256 hex), используется для проверки старых записей."""
+    return hashlib.sha256(password.encode('utf-8')).hexdigest()
 
 # 2.5. UserUpload (Загруженные работы)
 class UserUpload(Base):
@@ -73,12 +150,30 @@ class UserUpload(Base):
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     gost_id = Column(Integer, ForeignKey('gosts.id'), nullable=True)
     status = Column(String(50), default='Ожидает проверки')
-    upload_date = Column(DateTime, default=datetime.now)
+    upload_date = Column(DateTime, server_default=LOCAL_NOW)  # время сервера БД, выводится пользователю как есть
     report_json = Column(Text, nullable=True)  # Поле для хранения отчета в формате JSON
+    report_zstd = Column(LargeBinary, nullable=True)  # Тот же отчёт, сжатый zstd (вместо report_json, если есть zstandard)
 
     user = relationship("User", back_populates="uploads")
     gost = relationship("GOST")
 
+    # Списки работ выбираются по пользователю и сортируются по дате - индекс отдаёт их уже упорядоченными
+    __table_args__ = (Index('ix_user_uploads_user_id_upload_date', 'user_id', 'upload_date'),)
+
+
+# 2.6. AnalysisCache (Готовые отчёты по содержимому файла)
+class AnalysisCache(Base):
+    __tablename__ = 'analysis_cache'
+    id = Column(Integer, primary_key=True)
+    content_hash = Column(String(32), nullable=False)  # blake2b (16 байт) содержимого файла, hex
+    gost_id = Column(Integer, ForeignKey('gosts.id'), nullable=False)
+    report_json = Column(Text, nullable=True)
+    report_zstd = Column(LargeBinary, nullable=True)  # заполняется одно из двух полей, как в UserUpload
+    created_at = Column(DateTime, server_default=LOCAL_NOW)
+
+    # Поиск идёт по паре (хеш, ГОСТ); уникальность не даёт сохранить отчёт дважды
+    __table_args__ = (Index('ix_analysis_cache_hash_gost', 'content_hash', 'gost_id', unique=True),)
+
 
 # --- 3. Управление сессиями ---
 Session = sessionmaker(bind=engine)
@@ -88,6 +183,25 @@ def get_session():
     return Session()
 
 
+# Тестовые пользователи (пароль у всех SEED_PASSWORD, company_id проставляется при заполнении)
+SEED_PASSWORD = '1234567890'
+SEED_USERS = [
+    dict(login='private_user', email='private@mail.com', client_type='private', activity_type='Student'),
+    dict(login='company_user', email='company@techsol.com', client_type='company', activity_type='Engineer'),
+]
+
+# Отчёт для тестовой загрузки - константа, сериализуется один раз при импорте
+_TEST_REPORT_JSON = json.dumps({
+    "version": 1, 
+    "errors": [
+        "Заголовок не по центру (п. 2.1)", 
+        "Отсутствует нумерация страниц (п. 4.5)", 
+        "Размер шрифта не соответствует ГОСТу (п. 1.2)"
+    ], 
+    "ai_recommendation": "Сосредоточьтесь на оформлении титульного листа и правилах цитирования."
+}, ensure_ascii=False)
+
+
 def initialize_database():
     """УДАЛЯЕТ СТАРУЮ БД (для гарантированного MVP) и инициализирует новую с тестовыми данными."""
     global engine, Session
@@ -97,15 +211,24 @@ def initialize_database():
     if os.path.exists(db_file_path):
         print(f"Обнаружен старый файл БД '{db_file_path}'. Удаляю для чистого старта MVP...")
         try:
+            engine.dispose()
             os.remove(db_file_path)
+            # Журнал WAL и разделяемая память относятся к старому файлу
+            for suffix in ("-wal", "-shm"):
+                try:
+                    os.remove(db_file_path + suffix)
+                except FileNotFoundError:
+                    pass
             # Пересоздаем engine и Session
-            engine = create_engine(DATABASE_URL)
+            engine = _create_engine()
             Session = sessionmaker(bind=engine)
         except OSError as e:
             print(f"Ошибка при удалении файла БД: {e}. Возможно, он заблокирован.")
             
     print("Проверка/создание базы данных и таблиц...")
-    Base.metadata.create_all(engine)
+    # Для нового (пустого) файла проверка существования таблиц не нужна:
+    # checkfirst=False избавляет от PRAGMA table_info на каждую таблицу
+    Base.metadata.create_all(engine, checkfirst=os.path.exists(db_file_path))
     
     session = Session()
     
@@ -116,11 +239,10 @@ def initialize_database():
         # 1. Тестовая компания
         comp_a = Company(name='TechSolutions', corporate_email='@techsol.com')
         session.add(comp_a)
-        session.commit()
+        session.flush()  # flush заполняет comp_a.id без отдельного SELECT
         
         # 2. Тестовые ключи для компании
         session.add(KeyCompany(key_value='COMPANYKEY123', company_id=comp_a.id, is_active=True))
-        session.commit()
         
         # 3. Тестовые ГОСТы - ОБНОВЛЕНО: добавлен второй ГОСТ
         gost_bibliography = GOST(
@@ -149,54 +271,26 @@ def initialize_database():
         )
         
         session.add_all([gost_bibliography, gost_report, gost_corporate])
-        session.commit()
-        
-        # Получаем ID для связей
-        gost_id_1 = session.query(GOST.id).filter_by(name='ГОСТ Р 7.0.5-2008 (Библиографические ссылки)').one()[0]
-        comp_a_id = session.query(Company.id).filter_by(name='TechSolutions').one()[0]
-
-        # 4. Добавление тестовых пользователей
-        user_private = User(
-            login='private_user', 
-            email='private@mail.com', 
-            client_type='private', 
-            activity_type='Student'
-        )
-        user_private.set_password('1234567890')
-        
-        user_company = User(
-            login='company_user', 
-            email='company@techsol.com', 
-            client_type='company', 
-            company_id=comp_a_id, 
-            activity_type='Engineer'
-        )
-        user_company.set_password('1234567890')
-        
-        session.add_all([user_private, user_company])
-        session.commit()
+        session.flush()
 
-        # 5. Добавление тестовой загрузки для демонстрации
-        user_private_obj = session.query(User).filter_by(login='private_user').one()
-        
-        test_report = json.dumps({
-            "version": 1, 
-            "errors": [
-                "Заголовок не по центру (п. 2.1)", 
-                "Отсутствует нумерация страниц (п. 4.5)", 
-                "Размер шрифта не соответствует ГОСТу (п. 1.2)"
-            ], 
-            "ai_recommendation": "Сосредоточьтесь на оформлении титульного листа и правилах цитирования."
-        }, ensure_ascii=False)
+        # 4. Добавление тестовых пользователей одним executemany без создания ORM-объектов
+        seed_password_hash = _hash_password(SEED_PASSWORD)
+        user_rows = [
+            dict(row, password_hash=seed_password_hash,
+                 company_id=comp_a.id if row['client_type'] == 'company' else None)
+            for row in SEED_USERS
+        ]
+        session.bulk_insert_mappings(User, user_rows, return_defaults=True)
+        user_private_id = next(row['id'] for row in user_rows if row['login'] == 'private_user')
 
+        # 5. Добавление тестовой загрузки для демонстрации
         session.add(UserUpload(
             filename='Test_Laba_v1.docx', 
-            file_path=os.path.join("uploads", str(uuid.uuid4()) + ".docx"), 
-            user_id=user_private_obj.id, 
-            gost_id=gost_id_1, 
+            file_path=os.path.join("uploads", uuid.uuid4().hex + ".docx"), 
+            user_id=user_private_id, 
+            gost_id=gost_bibliography.id, 
             status='Проверено',
-            report_json=test_report, 
-            upload_date=datetime.now()
+            report_json=_TEST_REPORT_JSON
         ))
         session.commit()
         
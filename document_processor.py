@@ -2,11 +2,39 @@
 
 import os
 import io
-import base64
+import atexit
+import logging
 import tempfile
 import shutil
+import subprocess
+import time
+import socket
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from concurrent.futures.process import BrokenProcessPool
 from PIL import Image
-from typing import List, Tuple, Optional
+from typing import List, Tuple, Optional, Union
+
+# SIMD-ускоренный base64 (AVX2/SSSE3), при отсутствии - стандартный модуль
+try:
+    import pybase64 as base64
+except ImportError:
+    import base64
+
+# Логгер модуля: обработчик и форматтер создаются один раз при импорте,
+# повторный импорт (reload) не дублирует вывод. Если приложение настроило
+# корневой логгер (до или после импорта), сообщения идут только через него
+LOG_FORMAT = "%(asctime)s [%(levelname)s] %(name)s: %(message)s"
+_LOG_FORMATTER = logging.Formatter(LOG_FORMAT)
+
+logger = logging.getLogger(__name__)
+if not logger.handlers and not logging.getLogger().handlers:
+    _log_handler = logging.StreamHandler()
+    _log_handler.setFormatter(_LOG_FORMATTER)
+    _log_handler.addFilter(lambda record: not logging.getLogger().handlers)
+    logger.addHandler(_log_handler)
+    logger.setLevel(logging.INFO)
 
 # Попытка импорта библиотек для работы с PDF
 try:
@@ -14,14 +42,14 @@ try:
     PYMUPDF_AVAILABLE = True
 except ImportError:
     PYMUPDF_AVAILABLE = False
-    print("PyMuPDF не установлен. Установите: pip install PyMuPDF")
+    logger.warning("PyMuPDF не установлен. Установите: pip install PyMuPDF")
 
 try:
     from pdf2image import convert_from_path
     PDF2IMAGE_AVAILABLE = True
 except ImportError:
     PDF2IMAGE_AVAILABLE = False
-    print("pdf2image не установлен. Установите: pip install pdf2image")
+    logger.warning("pdf2image не установлен. Установите: pip install pdf2image")
 
 # Для работы с DOCX
 try:
@@ -29,7 +57,7 @@ try:
     DOCX_AVAILABLE = True
 except ImportError:
     DOCX_AVAILABLE = False
-    print("python-docx не установлен. Установите: pip install python-docx")
+    logger.warning("python-docx не установлен. Установите: pip install python-docx")
 
 # Для конвертации DOCX в PDF
 try:
@@ -37,11 +65,131 @@ try:
     DOCX2PDF_AVAILABLE = True
 except ImportError:
     DOCX2PDF_AVAILABLE = False
-    print("docx2pdf не установлен. Установите: pip install docx2pdf")
+    logger.warning("docx2pdf не установлен. Установите: pip install docx2pdf")
+
+
+# Сколько ждать, пока запущенный LibreOffice-слушатель откроет порт (секунды)
+SOFFICE_START_TIMEOUT = 30
+
+# Пулы процессов создаются из многопоточного процесса (веб-сервер, фоновый анализ,
+# логирование): fork копирует чужие захваченные блокировки, поэтому рабочие процессы
+# запускаются через forkserver (на Windows его нет - там spawn)
+_MP_CONTEXT = multiprocessing.get_context(
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+
+# Поддерживаемые расширения входных документов
+_SUPPORTED_EXTS = frozenset({'.pdf', '.docx', '.doc'})
+
+
+def _render_page_range(pdf_path: str, page_nums: range, zoom: float) -> List[Tuple[int, int, bytes]]:
+    """
+    Рендерит диапазон страниц PDF в RGB. Выполняется в процессе пула,
+    поэтому возвращает сырые байты, а не PIL Image (дешевле передавать между процессами).
+    Документ открывается и матрица создаётся один раз на диапазон, а не на страницу.
+    
+    Args:
+        pdf_path: Путь к PDF файлу
+        page_nums: Номера страниц (с нуля)
+        zoom: Масштаб относительно 72 DPI
+        
+    Returns:
+        Список кортежей (ширина, высота, RGB байты)
+    """
+    doc = fitz.open(pdf_path)
+    try:
+        matrix = fitz.Matrix(zoom, zoom)
+        rendered = []
+        for page_num in page_nums:
+            pix = doc[page_num].get_pixmap(matrix=matrix)
+            rendered.append((pix.width, pix.height, pix.samples))
+        return rendered
+    finally:
+        doc.close()
+
+
+def _encode_page_range(pdf_path: str, page_nums: range, zoom: float, fmt: str, quality: int) -> List[bytes]:
+    """
+    Рендерит диапазон страниц PDF и сразу кодирует их средствами PyMuPDF,
+    минуя промежуточный PIL Image. Выполняется в процессе пула.
+    
+    Args:
+        pdf_path: Путь к PDF файлу
+        page_nums: Номера страниц (с нуля)
+        zoom: Масштаб относительно 72 DPI
+        fmt: Формат изображения (png, jpeg)
+        quality: Качество JPEG
+        
+    Returns:
+        Список закодированных байтов изображений
+    """
+    doc = fitz.open(pdf_path)
+    try:
+        matrix = fitz.Matrix(zoom, zoom)
+        return [
+            doc[page_num].get_pixmap(matrix=matrix).tobytes(output=fmt, jpg_quality=quality)
+            for page_num in page_nums
+        ]
+    finally:
+        doc.close()
+
+
+def _find_free_port() -> int:
+    """Возвращает свободный локальный TCP-порт, выделенный системой."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('localhost', 0))
+        return sock.getsockname()[1]
+
+
+def _soffice_profile_dir() -> str:
+    """Каталог профиля LibreOffice для слушателя текущего процесса."""
+    return os.path.join(tempfile.gettempdir(), f"workwise_soffice_{os.getpid()}")
+
+
+def _wait_for_port(port: int, process: subprocess.Popen, timeout: float) -> bool:
+    """
+    Ждёт, пока процесс начнёт принимать соединения на порту.
+    
+    Returns:
+        True, если порт открылся; False, если процесс завершился или истёк таймаут
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            return False
+        try:
+            with socket.create_connection(('localhost', port), timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
 
 
 class DocumentProcessor:
-    """Класс для обработки документов и преобразования их в изображения."""
+    """
+    Класс для обработки документов и преобразования их в изображения.
+    
+    Один экземпляр обслуживает несколько потоков анализа: временная директория
+    у каждого потока своя (threading.local), общий пул рендеринга создаётся под
+    _render_pool_lock, а постоянный LibreOffice-слушатель - под _soffice_lock.
+    """
+    
+    # Пул процессов для рендеринга страниц, общий для всех экземпляров
+    RENDER_WORKERS = min(os.cpu_count() or 1, 4)
+    _render_pool: Optional[ProcessPoolExecutor] = None
+    _render_pool_lock = threading.Lock()
+    # Предел ожидания рендеринга одного документа (секунды): зависшая страница
+    # не должна навсегда занять поток анализа
+    RENDER_TIMEOUT = 120
+    
+    # Постоянный процесс LibreOffice (soffice --accept) и блокировка для него:
+    # LibreOffice однопоточен, конвертации через один экземпляр выполняем по очереди
+    _soffice_process: Optional[subprocess.Popen] = None
+    _soffice_port: Optional[int] = None
+    _soffice_started = False
+    _soffice_lock = threading.Lock()
+    
+    # Временные директории удаляются в фоне, чтобы не задерживать ответ
+    _cleanup_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="workwise_cleanup")
     
     def __init__(self, dpi: int = 150, max_pages: int = 50):
         """
@@ -53,7 +201,18 @@ class DocumentProcessor:
         """
         self.dpi = dpi
         self. max_pages = max_pages
-        self.temp_dir = None
+        # Временная директория своя у каждого потока: один экземпляр обслуживает
+        # параллельные запросы, и очистка в одном потоке не задевает файлы другого
+        self._local = threading.local()
+    
+    @property
+    def temp_dir(self) -> Optional[str]:
+        """Временная директория текущего потока."""
+        return getattr(self._local, 'temp_dir', None)
+    
+    @temp_dir.setter
+    def temp_dir(self, value: Optional[str]):
+        self._local.temp_dir = value
     
     def _create_temp_dir(self) -> str:
         """Создаёт временную директорию для файлов."""
@@ -62,14 +221,87 @@ class DocumentProcessor:
         return self.temp_dir
     
     def _cleanup_temp_dir(self):
-        """Удаляет временную директорию."""
-        if self.temp_dir and os. path.exists(self.temp_dir):
-            try:
-                shutil.rmtree(self.temp_dir)
-            except Exception as e:
-                print(f"Ошибка при удалении временной директории: {e}")
+        """Удаляет временную директорию (в фоновом потоке)."""
+        if self.temp_dir:
+            self._cleanup_pool.submit(shutil.rmtree, self.temp_dir, ignore_errors=True)
             self.temp_dir = None
     
+    @classmethod
+    def _get_render_pool(cls) -> ProcessPoolExecutor:
+        """Возвращает пул процессов для рендеринга, создавая его при первом обращении."""
+        # Первый рендеринг могут начать одновременно несколько потоков анализа:
+        # без блокировки каждый создал бы свой пул, и лишние не были бы закрыты
+        with cls._render_pool_lock:
+            if cls._render_pool is None:
+                cls._render_pool = ProcessPoolExecutor(max_workers=cls.RENDER_WORKERS,
+                                                       mp_context=_MP_CONTEXT)
+            return cls._render_pool
+    
+    @classmethod
+    def _discard_render_pool(cls, pool: ProcessPoolExecutor):
+        """
+        Убирает сломанный (упал рабочий процесс) или зависший пул: следующий
+        рендеринг создаст новый, а не будет получать BrokenProcessPool до перезапуска.
+        """
+        with cls._render_pool_lock:
+            if cls._render_pool is pool:
+                cls._render_pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+    
+    @classmethod
+    def _ensure_soffice(cls) -> bool:
+        """
+        Запускает фоновый LibreOffice-слушатель при первом обращении.
+        
+        Returns:
+            True, если слушатель запущен и доступен unoconv
+        """
+        if cls._soffice_process is not None:
+            if cls._soffice_process.poll() is None:
+                return True
+            # Слушатель упал (или был убит) - перезапускаем, иначе unoconv
+            # будет ждать соединения до таймаута на каждой конвертации
+            logger.warning("⚠️ LibreOffice-слушатель завершился (код %s), перезапуск",
+                           cls._soffice_process.returncode)
+            cls._soffice_process = None
+        
+        soffice = shutil.which('soffice') or shutil.which('libreoffice')
+        if not soffice or not shutil.which('unoconv'):
+            return False
+        
+        if not cls._soffice_started:
+            cls._soffice_started = True
+            atexit.register(cls._stop_soffice)
+        
+        # У каждого процесса приложения свой слушатель: свободный порт и свой профиль
+        # (с общим профилем второй soffice передаёт задание первому и сразу завершается)
+        cls._soffice_port = _find_free_port()
+        cls._soffice_process = subprocess.Popen([
+            soffice, f'-env:UserInstallation=file://{_soffice_profile_dir()}',
+            '--headless', '--invisible', '--nologo', '--norestore',
+            f'--accept=socket,host=localhost,port={cls._soffice_port};urp;'
+        ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        
+        if not _wait_for_port(cls._soffice_port, cls._soffice_process, SOFFICE_START_TIMEOUT):
+            logger.warning("⚠️ LibreOffice-слушатель не открыл порт %s, используем разовый запуск",
+                           cls._soffice_port)
+            cls._stop_soffice()
+            return False
+        return True
+    
+    @classmethod
+    def _stop_soffice(cls):
+        """Останавливает фоновый LibreOffice-слушатель."""
+        if cls._soffice_process is not None and cls._soffice_process.poll() is None:
+            cls._soffice_process.terminate()
+            try:
+                cls._soffice_process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                cls._soffice_process.kill()
+        cls._soffice_process = None
+        cls._soffice_port = None
+        shutil.rmtree(_soffice_profile_dir(), ignore_errors=True)
+    
     def get_file_extension(self, filename: str) -> str:
         """Возвращает расширение файла в нижнем регистре."""
         return os. path.splitext(filename)[1].lower()
@@ -77,7 +309,7 @@ class DocumentProcessor:
     def is_supported_format(self, filename: str) -> bool:
         """Проверяет, поддерживается ли формат файла."""
         ext = self.get_file_extension(filename)
-        return ext in ['.pdf', '. docx', '.doc']
+        return ext in _SUPPORTED_EXTS
     
     def pdf_to_images_pymupdf(self, pdf_path: str) -> List[Image.Image]:
         """
@@ -92,31 +324,73 @@ class DocumentProcessor:
         if not PYMUPDF_AVAILABLE:
             raise ImportError("PyMuPDF не установлен")
         
+        rendered = self._render_pages(_render_page_range, pdf_path)
+        
+        # Прогресс по страницам пишется только при включённом DEBUG
+        log_pages = logger.isEnabledFor(logging.DEBUG)
         images = []
-        doc = fitz.open(pdf_path)
+        for page_num, (width, height, samples) in enumerate(rendered):
+            # Преобразуем в PIL Image: frombuffer использует байты страницы без копирования
+            images.append(Image.frombuffer("RGB", (width, height), samples, "raw", "RGB", 0, 1))
+            if log_pages:
+                logger.debug("Обработана страница %d/%d", page_num + 1, len(rendered))
+        
+        return images
+    
+    def pdf_to_encoded_bytes(self, pdf_path: str, fmt: str = "jpeg", quality: int = 85) -> List[bytes]:
+        """
+        Преобразует PDF в список закодированных изображений (PNG/JPEG) напрямую через PyMuPDF.
+        
+        Args:
+            pdf_path: Путь к PDF файлу
+            fmt: Формат изображений (png, jpeg)
+            quality: Качество JPEG
+            
+        Returns:
+            Список байтов закодированных изображений
+        """
+        if not PYMUPDF_AVAILABLE:
+            raise ImportError("PyMuPDF не установлен")
+        
+        return self._render_pages(_encode_page_range, pdf_path, fmt, quality)
+    
+    def _render_pages(self, worker, pdf_path: str, *args) -> list:
+        """
+        Применяет worker(pdf_path, page_nums, zoom, *args) ко всем обрабатываемым страницам PDF.
+        Страницы делятся на непрерывные диапазоны по числу процессов пула; один диапазон
+        (например, одностраничный документ) обрабатывается на месте.
         
+        Returns:
+            Результаты worker по страницам в порядке страниц
+        """
+        doc = fitz.open(pdf_path)
         try:
             page_count = min(len(doc), self.max_pages)
-            
-            for page_num in range(page_count):
-                page = doc[page_num]
-                
-                # Увеличиваем разрешение для лучшего качества
-                zoom = self.dpi / 72  # 72 - стандартное разрешение PDF
-                mat = fitz.Matrix(zoom, zoom)
-                
-                # Рендерим страницу в изображение
-                pix = page.get_pixmap(matrix=mat)
-                
-                # Преобразуем в PIL Image
-                img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-                images. append(img)
-                
-                print(f"Обработана страница {page_num + 1}/{page_count}")
         finally:
             doc. close()
         
-        return images
+        # Увеличиваем разрешение для лучшего качества
+        zoom = self.dpi / 72  # 72 - стандартное разрешение PDF
+        
+        step = max(1, -(-page_count // self.RENDER_WORKERS))
+        page_ranges = [range(start, min(start + step, page_count)) for start in range(0, page_count, step)]
+        
+        if len(page_ranges) <= 1:
+            return [result for page_nums in page_ranges for result in worker(pdf_path, page_nums, zoom, *args)]
+        
+        pool = self._get_render_pool()
+        deadline = time.monotonic() + self.RENDER_TIMEOUT
+        try:
+            futures = [pool.submit(worker, pdf_path, page_nums, zoom, *args) for page_nums in page_ranges]
+            return [result for future in futures
+                    for result in future.result(timeout=max(0, deadline - time.monotonic()))]
+        except BrokenProcessPool:
+            # Рабочий процесс упал (segfault MuPDF на битом PDF, OOM killer)
+            self._discard_render_pool(pool)
+            raise
+        except FuturesTimeoutError:
+            self._discard_render_pool(pool)
+            raise RuntimeError(f"Рендеринг страниц не уложился в {self.RENDER_TIMEOUT} с")
     
     def pdf_to_images_pdf2image(self, pdf_path: str) -> List[Image.Image]:
         """
@@ -156,14 +430,14 @@ class DocumentProcessor:
             try:
                 return self.pdf_to_images_pymupdf(pdf_path)
             except Exception as e:
-                print(f"Ошибка PyMuPDF: {e}, пробуем pdf2image...")
+                logger.warning("Ошибка PyMuPDF: %s, пробуем pdf2image...", e)
         
         # Запасной вариант - pdf2image
         if PDF2IMAGE_AVAILABLE:
             try:
                 return self.pdf_to_images_pdf2image(pdf_path)
             except Exception as e:
-                print(f"Ошибка pdf2image: {e}")
+                logger.error("Ошибка pdf2image: %s", e)
                 raise
         
         raise ImportError("Не установлены библиотеки для работы с PDF.  Установите PyMuPDF или pdf2image.")
@@ -179,7 +453,7 @@ class DocumentProcessor:
             Путь к созданному PDF файлу
         """
         temp_dir = self._create_temp_dir()
-        pdf_filename = os.path. splitext(os.path.basename(docx_path))[0] + ". pdf"
+        pdf_filename = os.path. splitext(os.path.basename(docx_path))[0] + ".pdf"
         pdf_path = os. path.join(temp_dir, pdf_filename)
         
         if DOCX2PDF_AVAILABLE:
@@ -187,21 +461,41 @@ class DocumentProcessor:
                 docx_to_pdf_convert(docx_path, pdf_path)
                 return pdf_path
             except Exception as e:
-                print(f"Ошибка docx2pdf: {e}")
+                logger.warning("Ошибка docx2pdf: %s", e)
                 # Попробуем альтернативный метод
         
-        # Альтернативный метод через LibreOffice (если установлен)
+        # Альтернативный метод через LibreOffice (если установлен): сначала через
+        # постоянный слушатель, а если его нет или unoconv не справился (например,
+        # его python3-uno не совпадает с установленным LibreOffice) - разовым запуском
+        try:
+            with self._soffice_lock:
+                result = None
+                if self._ensure_soffice():
+                    result = subprocess.run([
+                        'unoconv', '--server', 'localhost', '--port', str(self._soffice_port),
+                        '-f', 'pdf', '-o', pdf_path, docx_path
+                    ], capture_output=True, timeout=60)
+            if result is not None:
+                if result.returncode == 0 and os.path.exists(pdf_path):
+                    return pdf_path
+                logger.warning("⚠️ unoconv завершился с кодом %s: %s", result.returncode,
+                               result.stderr.decode('utf-8', errors='replace').strip()[-500:])
+        except Exception as e:
+            logger.warning("⚠️ Ошибка unoconv: %s", e)
+        
         try:
-            import subprocess
-            result = subprocess.run([
-                'libreoffice', '--headless', '--convert-to', 'pdf',
-                '--outdir', temp_dir, docx_path
+            # Разовые запуски идут параллельно (без блокировки), поэтому у каждого свой
+            # профиль: с общим профилем второй soffice передаёт задание первому и завершается
+            profile_dir = tempfile.mkdtemp(prefix="lo_profile_", dir=temp_dir)
+            subprocess.run([
+                'libreoffice', f'-env:UserInstallation=file://{profile_dir}',
+                '--headless', '--convert-to', 'pdf', '--outdir', temp_dir, docx_path
             ], capture_output=True, timeout=60)
             
             if os.path.exists(pdf_path):
                 return pdf_path
         except Exception as e:
-            print(f"Ошибка LibreOffice: {e}")
+            logger.error("Ошибка LibreOffice: %s", e)
         
         raise RuntimeError("Не удалось преобразовать DOCX в PDF.  Установите docx2pdf или LibreOffice.")
     
@@ -221,6 +515,25 @@ class DocumentProcessor:
         # Затем PDF в изображения
         return self.pdf_to_images(pdf_path)
     
+    def file_to_pdf(self, file_path: str) -> str:
+        """
+        Возвращает путь к PDF для файла: PDF как есть, DOCX - после конвертации.
+        
+        Args:
+            file_path: Путь к файлу
+            
+        Returns:
+            Путь к PDF файлу
+        """
+        ext = self.get_file_extension(file_path)
+        
+        if ext == '.pdf':
+            return file_path
+        elif ext in ['.docx', '.doc']:
+            return self.docx_to_pdf(file_path)
+        else:
+            raise ValueError(f"Неподдерживаемый формат файла: {ext}")
+    
     def file_to_images(self, file_path: str) -> List[Image. Image]:
         """
         Преобразует файл (PDF или DOCX) в список изображений. 
@@ -240,34 +553,53 @@ class DocumentProcessor:
         else:
             raise ValueError(f"Неподдерживаемый формат файла: {ext}")
     
-    def image_to_base64(self, image: Image.Image, format: str = "PNG") -> str:
+    def image_to_base64(self, image: Union[Image.Image, bytes], format: str = "JPEG", quality: int = 85) -> str:
         """
         Преобразует PIL Image в base64 строку.
+        По умолчанию JPEG: для страниц документа он в разы меньше и быстрее PNG;
+        PNG стоит выбирать для OCR, где артефакты сжатия мешают.
         
         Args:
-            image: PIL Image объект
+            image: PIL Image объект или уже закодированные байты PNG/JPEG
+                (кодируются в base64 как есть, format и quality игнорируются)
             format: Формат изображения (PNG, JPEG)
+            quality: Качество JPEG
             
         Returns:
             Base64 закодированная строка
         """
+        if isinstance(image, (bytes, bytearray, memoryview)):
+            return base64.b64encode(image).decode('ascii')
+        
         buffer = io.BytesIO()
-        image.save(buffer, format=format)
-        buffer.seek(0)
-        return base64.b64encode(buffer.getvalue()).decode('utf-8')
+        if format.upper() in ("JPEG", "JPG"):
+            if image.mode != "RGB":
+                image = image.convert("RGB")
+            image.save(buffer, format="JPEG", quality=quality, optimize=False, progressive=False)
+        else:
+            image.save(buffer, format=format)
+        # getbuffer() отдаёт содержимое без копирования; алфавит base64 - чистый ASCII
+        return base64.b64encode(buffer.getbuffer()).decode('ascii')
     
-    def images_to_base64_list(self, images: List[Image. Image], format: str = "PNG") -> List[str]:
+    def images_to_base64_list(self, images: List[Image. Image], format: str = "JPEG",
+                              quality: int = 85) -> List[str]:
         """
         Преобразует список изображений в список base64 строк.
         
         Args:
             images: Список PIL Image объектов
             format: Формат изображений
+            quality: Качество JPEG
             
         Returns:
             Список base64 закодированных строк
         """
-        return [self.image_to_base64(img, format) for img in images]
+        if len(images) <= 1:
+            return [self.image_to_base64(img, format, quality) for img in images]
+        
+        # Кодирование PIL выполняется в C без GIL, поэтому страницы сжимаются параллельно
+        with ThreadPoolExecutor(max_workers=min(len(images), os.cpu_count() or 4)) as executor:
+            return list(executor.map(lambda img: self.image_to_base64(img, format, quality), images))
     
     def process_document(self, file_path: str) -> Tuple[List[Image.Image], List[str]]:
         """
@@ -280,7 +612,20 @@ class DocumentProcessor:
             Кортеж (список изображений, список base64 строк)
         """
         try:
-            images = self.file_to_images(file_path)
+            pdf_path = self.file_to_pdf(file_path)
+            
+            # Основной путь: PyMuPDF сразу выдаёт JPEG, без PIL и повторного кодирования
+            if PYMUPDF_AVAILABLE:
+                try:
+                    encoded = self.pdf_to_encoded_bytes(pdf_path)
+                    base64_images = [self.image_to_base64(data) for data in encoded]
+                    # Image.open ленивый: пиксели декодируются только при обращении (например, для OCR)
+                    images = [Image.open(io.BytesIO(data)) for data in encoded]
+                    return images, base64_images
+                except Exception as e:
+                    logger.warning("Ошибка PyMuPDF: %s, пробуем pdf2image...", e)
+            
+            images = self.pdf_to_images_pdf2image(pdf_path)
             base64_images = self.images_to_base64_list(images)
             return images, base64_images
         finally:
@@ -300,17 +645,22 @@ class DocumentProcessor:
         try:
             import pytesseract
             
-            texts = []
-            for i, img in enumerate(images):
-                text = pytesseract.image_to_string(img, lang='rus+eng')
-                texts.append(f"--- Страница {i + 1} ---\n{text}")
+            if not images:
+                return ""
+            
+            # tesseract работает отдельным процессом, а pytesseract лишь ждёт его,
+            # поэтому для параллельного распознавания страниц хватает потоков
+            with ThreadPoolExecutor(max_workers=min(len(images), os.cpu_count() or 1)) as executor:
+                page_texts = list(executor.map(
+                    lambda img: pytesseract.image_to_string(img, lang='rus+eng'), images))
             
+            texts = [f"--- Страница {i + 1} ---\n{text}" for i, text in enumerate(page_texts)]
             return "\n\n".join(texts)
         except ImportError:
-            print("pytesseract не установлен. OCR недоступен.")
+            logger.warning("pytesseract не установлен. OCR недоступен.")
             return ""
         except Exception as e:
-            print(f"Ошибка OCR: {e}")
+            logger.error("Ошибка OCR: %s", e)
             return ""
 
 